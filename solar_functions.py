@@ -3,6 +3,7 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
+import numba
 import pytz
 import pvlib
 from pvlib.pvsystem import PVSystem
@@ -11,6 +12,14 @@ from pvlib.modelchain import ModelChain
 from pvlib.tracking import SingleAxisTracker
 from pvfactors.run import run_timeseries_engine
 import types
+import hashlib
+import json
+import os
+import tempfile
+import warnings
+from pathlib import Path
+from functools import lru_cache
+from joblib import Parallel, delayed, cpu_count
 
 
 def get_psm3(lat, lon, email, api_key, year = 'tmy', time_step = 60,
@@ -41,6 +50,9 @@ def get_psm3(lat, lon, email, api_key, year = 'tmy', time_step = 60,
     NREL's resource data tends to be biased high.  This is a factor that can be
     used to correct this bias.
   
+  Responses are cached under ~/.cache/solar-models/psm3 by lat, lon, year and
+  time_step, so repeat calls for the same site don't hit the NREL API again.
+  
   Returns:
   weather: pandas.DataFrame
     time series weather data with columns ['ghi', 'dni', 'dhi', 'temp_air',
@@ -52,32 +64,124 @@ def get_psm3(lat, lon, email, api_key, year = 'tmy', time_step = 60,
   
   '''
 
-  psm3 = pvlib.iotools.get_psm3(lat, lon, api_key, email, names = year,
-                                interval = time_step)
-  psm3_df = psm3[1]
+  key = hashlib.sha1(f"{lat:.4f}_{lon:.4f}_{year}_{time_step}".encode())
+  cache = Path.home() / '.cache' / 'solar-models' / 'psm3'
+  cache_weather = cache / (key.hexdigest() + '.parquet')
+  cache_meta = cache / (key.hexdigest() + '.json')
+  
+  # Reuse a previous response for this site if there is one (the json sidecar
+  # is written last, so it only exists for complete entries)
+  if cache_weather.exists() and cache_meta.exists():
+      psm3_df = pd.read_parquet(cache_weather)
+      with open(cache_meta) as f:
+          meta = json.load(f)
   
-  weather = psm3_df.filter(['GHI', 'DNI', 'DHI', 'Temperature', 'Wind Speed',
-                            'Surface Albedo'])
-                            
-  weather.columns = ['ghi', 'dni', 'dhi', 'temp_air', 'wind_speed',
-                     'surface_albedo']
+  else:
+      psm3 = pvlib.iotools.get_psm3(lat, lon, api_key, email, names = year,
+                                    interval = time_step)
+      psm3_df = psm3[1][['GHI', 'DNI', 'DHI', 'Temperature', 'Wind Speed',
+                         'Surface Albedo']]
+      
+      # Site Meta Data
+      meta = {'utc_offset': psm3[0]['Time Zone'],
+              'elevation': psm3[0]['Elevation']}
+      
+      # Write to unique temp files and move them into place so an interrupted
+      # or concurrent write never leaves a truncated cache entry behind.  The
+      # cache is only an optimization, so a failed write just warns.
+      tmp_files = []
+      try:
+          cache.mkdir(parents = True, exist_ok = True)
+          
+          with tempfile.NamedTemporaryFile(dir = cache, suffix = '.tmp',
+                                           delete = False) as f:
+              tmp_files.append(f.name)
+              psm3_df.to_parquet(f, compression = 'zstd')
+          os.replace(f.name, cache_weather)
+          
+          with tempfile.NamedTemporaryFile('w', dir = cache, suffix = '.tmp',
+                                           delete = False) as f:
+              tmp_files.append(f.name)
+              json.dump(meta, f)
+          os.replace(f.name, cache_meta)
+      
+      except (OSError, ImportError) as e:
+          warnings.warn(f'Could not cache PSM3 response: {e}')
+          for tmp in tmp_files:
+              if os.path.exists(tmp):
+                  os.remove(tmp)
+  
+  # Single precision is well within the resource data's uncertainty and halves
+  # the memory moved by each model step
+  weather = psm3_df.to_numpy(dtype = np.float32, copy = True)
   
-  weather.index = psm3_df.index
+  #  A fudge factor to account for model bias (ghi, dni, dhi)
+  weather[:, 0:3] *= nrel_fudge
   
-  weather = weather.assign(soiling = soiling_loss)
+  weather = pd.DataFrame(weather, index = psm3_df.index,
+                         columns = ['ghi', 'dni', 'dhi', 'temp_air',
+                                    'wind_speed', 'surface_albedo'])
+  weather['soiling'] = np.float32(soiling_loss)
   
-  #  A fudge factor to account for model bias
-  weather.ghi = weather.ghi * nrel_fudge
-  weather.dni = weather.dni * nrel_fudge
-  weather.dhi = weather.dhi * nrel_fudge
+  return {'weather': weather, 'utc_offset': meta['utc_offset'],
+          'elevation': meta['elevation']}
   
-  # Site Meta Data
-  utc_offset = psm3[0]['Time Zone']
-  elevation = psm3[0]['Elevation']
   
-  return {'weather': weather, 'utc_offset': utc_offset, 'elevation': elevation}
+# Racking-specific PVSystem builders used by get_system.  get_system passes
+# every racking input by keyword; each builder takes the ones it uses.
+
+def _build_tracker(axis_azimuth, gcr, module_parameters, axis_tilt, max_angle,
+                   backtrack, **kwargs):
+  # Single-Axis Tracker
+  return SingleAxisTracker(axis_tilt = axis_tilt,
+                           axis_azimuth = axis_azimuth,
+                           max_angle = max_angle, backtrack = backtrack,
+                           gcr = gcr, module_parameters = module_parameters)
+
+
+def _build_fixed(axis_azimuth, gcr, module_parameters, surface_tilt,
+                 surface_azimuth, **kwargs):
+  # Fixed-tilt System
+  system = PVSystem(surface_tilt = surface_tilt,
+                    surface_azimuth = surface_azimuth,
+                    module_parameters = module_parameters)
   
+  # These attributes get declared as part of SingleAxisTracker but not in
+  # PVSystem
+  system.axis_azimuth = axis_azimuth
+  system.gcr = gcr
+  system.backtrack = False
   
+  return system
+
+
+def _build_canopy(albedo, **kwargs):
+  system = _build_fixed(**kwargs)
+  
+  # Override system albedo for canopy and rooftop systems since time
+  # series albedo calculations assume typical ground coverage (grass)
+  system.albedo = albedo
+  # PVSystem always has an albedo attribute, so flag the override
+  # separately for get_effective_irradiance
+  system.albedo_override = albedo
+  
+  return system
+
+
+def _build_rooftop(**kwargs):
+  system = _build_canopy(**kwargs)
+  
+  system.module_parameters['bifaciality'] = 0
+  
+  return system
+
+
+_system_builders = {'tracker': _build_tracker,
+                    'ground-mount': _build_fixed,
+                    'rooftop': _build_rooftop,
+                    'canopy': _build_canopy}
+
+
 def get_system(racking, axis_height, collector_width, axis_azimuth, gcr,
                module_parameters, temperature_model_parameters,
                axis_tilt = 0, max_angle = 0, backtrack = False,
@@ -125,33 +229,19 @@ def get_system(racking, axis_height, collector_width, axis_azimuth, gcr,
   Note: Would have used a kwargs parameter to but doesnt work with reticulate
   '''
   
-  # Single-Axis Tracker
-  if racking == 'tracker':
-      system = SingleAxisTracker(axis_tilt = axis_tilt,
-                             axis_azimuth = axis_azimuth,
-                             max_angle = max_angle, backtrack = backtrack,
-                             gcr = gcr, module_parameters = module_parameters)
-  # Fixed-tilt System
-  else:
-      system = PVSystem(surface_tilt = surface_tilt,
-                    surface_azimuth = surface_azimuth,
-                    module_parameters = module_parameters)
-      
-      # These attributes get declared as part of SingleAxisTracker but not in
-      # PVSystem
-      system.axis_azimuth = axis_azimuth
-      system.gcr = gcr
-      system.backtrack = False
-      
-      # If racking is canopy or rooftop
-      if racking != 'ground-mount':
-          # Override system albedo for canopy and rooftop systems since time
-          # series albedo calculations assume typical ground coverage (grass)
-          system.albedo = albedo
-      
-      if racking == 'rooftop':
-          system.module_parameters['bifaciality'] = 0
-      
+  if racking not in _system_builders:
+      raise ValueError(f"racking must be one of {list(_system_builders)}, "
+                       f"not '{racking}'")
+  
+  system = _system_builders[racking](axis_azimuth = axis_azimuth, gcr = gcr,
+                                     module_parameters = module_parameters,
+                                     axis_tilt = axis_tilt,
+                                     max_angle = max_angle,
+                                     backtrack = backtrack,
+                                     surface_tilt = surface_tilt,
+                                     surface_azimuth = surface_azimuth,
+                                     albedo = albedo)
+  
   # Adding Attributes allows ModelChain to self-contain all project inputs
   system.axis_height = axis_height    
   system.collector_width = collector_width
@@ -160,6 +250,17 @@ def get_system(racking, axis_height, collector_width, axis_azimuth, gcr,
   return system
 
 
+@lru_cache(maxsize = 64)
+def _get_location(lat, lon, utc_offset, elevation, name):
+  '''
+  Cached Location constructor so sweeps over a single site don't rebuild the
+  timezone and location metadata for every ModelChain.
+  
+  '''
+  
+  return Location(lat, lon, utc_offset, elevation, name)
+
+
 def get_modelchain(lat, lon, utc_offset, elevation, name, system,
                   degradation_loss, bifacial_losses, dc_losses, ac_capacity,
                   inverter_efficiency_peak,
@@ -225,7 +326,7 @@ def get_modelchain(lat, lon, utc_offset, elevation, name, system,
   '''
   
   # ModelChain requires a PVSystem and Location and model parameters
-  location = Location(lat, lon, utc_offset, elevation, name)
+  location = _get_location(lat, lon, utc_offset, elevation, name)
   
   # Implement custom losses model and not one in PVLib
   mc = ModelChain(system, location, spectral_model = 'no_loss',
@@ -274,83 +375,142 @@ def get_effective_irradiance(self, weather, utc_offset):
   Returns:
   pvlib.modelchain
   
+  Note: the PVLib models only run on rows with the sun up or with irradiance,
+  so the intermediate modelchain attributes (weather, solar_position,
+  total_irrad, aoi, ...) only cover those rows.  effective_irradiance,
+  front_irradiance, back_irradiance, cell_temperature and the
+  effective_irradiance_* attributes are reindexed to the full weather index.
+  
   '''
   
   # Prepare weather DataFrame ----
   
   # Must be datetimeindex aware
-  tz = 'Etc/GMT+' + str(-utc_offset)
-  
-  # If pd.datetimeindex is naive, localize, otherwise convert
-  if(pd.to_datetime(weather.index).tz is None):
-    weather.index = pd.to_datetime(weather.index).tz_localize(tz)
+  tz = f"Etc/GMT{-int(utc_offset):+d}"
+  
+  # Only parse the index if it isn't already a pd.datetimeindex
+  index = weather.index
+  if not isinstance(index, pd.DatetimeIndex):
+    index = pd.DatetimeIndex(index)
+  
+  # If pd.datetimeindex is naive, localize, otherwise convert (unless it is
+  # already in the local timezone)
+  if index.tz is None:
+    weather.index = index.tz_localize(tz)
+  elif str(index.tz) != tz:
+    weather.index = index.tz_convert(tz)
   else:
-    weather.index = pd.to_datetime(weather.index).tz_convert(tz)
+    weather.index = index
     
   # Check if I should override weather's albedo values
-  # (only canopy or rooftop systems will have self.system.albedo values)
-  try:
-      weather.albedo = self.system.albedo
-  except:
-      pass
+  # (only canopy or rooftop systems will have self.system.albedo_override).
+  # assign works on a copy so the caller's weather keeps its own albedo.
+  if hasattr(self.system, 'albedo_override'):
+      weather = weather.assign(surface_albedo = self.system.albedo_override)
+  
+  # Nighttime rows produce no power, so run the models on daytime rows only
+  # and fill the nighttime rows back in once they are done.  Rows around
+  # sunrise and sunset can have zenith > 90 but still carry diffuse light, so
+  # keep any row with irradiance too.
+  zenith = self.location.get_solarposition(weather.index).zenith
+  day = ((zenith <= 90) | (weather.ghi > 0) | (weather.dhi > 0)).values
+  weather_day = weather[day]
   
   # Run PVLib models ----
   
-  self.prepare_inputs(weather)
+  self.prepare_inputs(weather_day)
   self.aoi_model()
   self.spectral_model()
   self.effective_irradiance_model()
   self.effective_irradiance = self.effective_irradiance.fillna(0)
   self.temperature_model()
   
+  # Monofacial systems (e.g. rooftop) get nothing from the backside, so skip
+  # the PVFactors viewshed model and use PVLib's frontside irradiance
+  if self.system.module_parameters.get('bifaciality', 0) == 0:
+      setattr(self, 'back_irradiance', pd.Series(0.0,
+                                                 index=weather_day.index))
+      setattr(self, 'front_irradiance', self.effective_irradiance)
+
   # Use PVFactors viewshed model ----
+
+  else:
+      # Surface Inputs calculated in prepare_inputs if tracking,
+      if isinstance(self.system, SingleAxisTracker):
+          surface_tilt = self.tracking.surface_tilt.values
+          surface_azimuth = self.tracking.surface_azimuth.values
+
+      # but must be manually calculated if fixed-tilt (zero-copy views of
+      # the constant angles rather than repeated arrays)
+      else:
+          surface_tilt = np.broadcast_to(np.float64(self.system.surface_tilt),
+                                         (len(weather_day.index),))
+          surface_azimuth = np.broadcast_to(
+                              np.float64(self.system.surface_azimuth),
+                              (len(weather_day.index),))
+
+      # Need a custom function to build the report of the PVFactors simulation
+      def pvfactor_build_report(pvarray): return {
+        'total_inc_back': pvarray.ts_pvrows[1].back.get_param_weighted(
+                                                      'qinc').tolist(),
+        'total_inc_front': pvarray.ts_pvrows[1].front.get_param_weighted(
+                                                      'qinc').tolist()
+      }
+
+      pvarray_parameters = {
+          'n_pvrows': 3,
+          'axis_azimuth': self.system.axis_azimuth,
+          'pvrow_height': self.system.axis_height,
+          'pvrow_width': self.system.collector_width,
+          'gcr': self.system.gcr,
+          # front and back reflectivity
+          'rho_front_pvrow': 0.01,
+          'rho_back_pvrow': .03,
+          # sky dome's diffuse horizon band angle
+          'horizon_band_angle': 15
+        }
+
+      # Each timestamp is independent, so split the time series across cores.
+      # Contiguous slices keep every fold a view rather than a copy (n_jobs is
+      # capped at the row count, so no fold is empty)
+      n_jobs = max(1, min(cpu_count(), len(weather_day.index)))
+      folds = [slice(fold[0], fold[-1] + 1) for fold in
+               np.array_split(np.arange(len(weather_day.index)), n_jobs)]
       
-  # Surface Inputs calculated in prepare_inputs if tracking,
-  if isinstance(self.system, SingleAxisTracker):
-      surface_tilt = self.tracking.surface_tilt
-      surface_azimuth = self.tracking.surface_azimuth
+      solar_zenith = self.solar_position.zenith.values
+      solar_azimuth = self.solar_position.azimuth.values
+      dni = weather_day.dni.values
+      dhi = weather_day.dhi.values
+      albedo = weather_day.surface_albedo.values
       
-  # but must be manually calculated if fixed-tilt
-  else:
-      surface_tilt = np.repeat(self.system.surface_tilt,
-                               len(self.weather.index))
-      surface_azimuth = np.repeat(self.system.surface_azimuth,
-                                  len(self.weather.index))
+      fold_reports = Parallel(n_jobs = n_jobs, backend = 'loky')(
+        delayed(run_timeseries_engine)(pvfactor_build_report,
+                                       pvarray_parameters,
+                                       weather_day.index[fold],
+                                       dni[fold], dhi[fold],
+                                       solar_zenith[fold], solar_azimuth[fold],
+                                       surface_tilt[fold],
+                                       surface_azimuth[fold], albedo[fold])
+        for fold in folds)
       
-  # Need a custom function to build the report of the PVFactors simulation
-  def pvfactor_build_report(pvarray): return {
-    'total_inc_back': pvarray.ts_pvrows[1].back.get_param_weighted(
-                                                  'qinc').tolist(),
-    'total_inc_front': pvarray.ts_pvrows[1].front.get_param_weighted(
-                                                  'qinc').tolist()
-  }
-  
-  pvarray_parameters = {
-      'n_pvrows': 3,
-      'axis_azimuth': self.system.axis_azimuth,
-      'pvrow_height': self.system.axis_height,
-      'pvrow_width': self.system.collector_width,
-      'gcr': self.system.gcr,
-      # front and back reflectivity
-      'rho_front_pvrow': 0.01,
-      'rho_back_pvrow': .03,
-      # sky dome's diffuse horizon band angle
-      'horizon_band_angle': 15
-    }
-  
-  pvfactor_report = run_timeseries_engine(pvfactor_build_report,
-                                          pvarray_parameters, weather.index,
-                                          weather.dni, weather.dhi,
-                                          self.solar_position.zenith,
-                                          self.solar_position.azimuth,
-                                          surface_tilt, surface_azimuth,
-                                          weather.surface_albedo)
-  
-  # Save the PVFactor results
-  pvfactor_df = pd.DataFrame(pvfactor_report, index=weather.index)
-    
-  setattr(self, 'back_irradiance', pvfactor_df.total_inc_back.fillna(0))
-  setattr(self, 'front_irradiance', pvfactor_df.total_inc_front.fillna(0))
+      # Folds come back in order, so the reports can be concatenated
+      pvfactor_report = {key: [value for report in fold_reports
+                                     for value in report[key]]
+                         for key in fold_reports[0]}
+
+      # Save the PVFactor results
+      pvfactor_df = pd.DataFrame(pvfactor_report, index=weather_day.index)
+
+      setattr(self, 'back_irradiance', pvfactor_df.total_inc_back.fillna(0))
+      setattr(self, 'front_irradiance', pvfactor_df.total_inc_front.fillna(0))
+  
+  # Fill nighttime rows back in: no irradiance, cells at ambient temperature
+  for attr in ['effective_irradiance', 'front_irradiance', 'back_irradiance']:
+      setattr(self, attr, getattr(self, attr).reindex(weather.index,
+                                                      fill_value = 0))
+  
+  self.cell_temperature = self.cell_temperature.reindex(weather.index)
+  self.cell_temperature = self.cell_temperature.fillna(weather.temp_air)
   
   # Calculate plane of array irradiance losses ----
   
@@ -360,88 +520,164 @@ def get_effective_irradiance(self, weather, utc_offset):
   # Effective Irradiance = Frontside POA + Backside POA *
   #                        (Bifaciality Reduced For Backside Losses)
   
+  bifacial_factor = (self.system.module_parameters['bifaciality'] *
+                     (1 - self.bifacial_losses))
+  
   if self.system.backtrack:
-      setattr(self, 'effective_irradiance_bifacial',
-                  self.effective_irradiance + self.back_irradiance *
-                    (self.system.module_parameters['bifaciality'] *
-                    (1-self.bifacial_losses)))
+      front = self.effective_irradiance
   else:
-      setattr(self, 'effective_irradiance_bifacial',
-                  self.front_irradiance + self.back_irradiance *
-                    (self.system.module_parameters['bifaciality'] *
-                    (1-self.bifacial_losses)))
+      front = self.front_irradiance
+  
+  setattr(self, 'effective_irradiance_bifacial',
+          front + self.back_irradiance * bifacial_factor)
   
   # Apply same soiling loss to front-and-backside POA (conservative approach)
   setattr(self, 'soiling', weather.soiling)
+  
+  # Soiling is usually constant (see get_psm3), so scale by a scalar if it is.
+  # Any NaN fails the comparison and keeps the element-wise path
+  soiling = self.soiling.to_numpy()
+  if soiling.size and (soiling == soiling[0]).all():
+      soiling_factor = 1 - soiling[0]
+  else:
+      soiling_factor = 1 - self.soiling
+  
   setattr(self, 'effective_irradiance_soiled',
-          self.effective_irradiance_bifacial * (1 - self.soiling))
+          self.effective_irradiance_bifacial * soiling_factor)
   
   return self
 
 
+# Same NaN-preserving fastmath flags as _ac_chain
+@numba.njit(fastmath = {'contract', 'arcp'}, cache = True)
+def _pvwatts_dc_loss_clip(g, temp_cell, pdc0, gamma_pdc, temp_ref, dc_losses,
+                          cap_over_eta):
+  '''
+  PVWatts DC model with dc losses and inverter clipping, fused into a single
+  pass over the effective irradiance and cell temperature.
+  
+  Returns:
+  pdc, losses, output, clipping: numpy.ndarray
+  
+  '''
+  
+  n = len(g)
+  pdc = np.empty(n)
+  losses = np.empty(n)
+  output = np.empty(n)
+  clipping = np.empty(n)
+  
+  for i in range(n):
+    p = (pdc0 * (g[i] * (1.0 / 1000.0)) *
+         (1.0 + gamma_pdc * (temp_cell[i] - temp_ref)))
+    pdc[i] = p
+    losses[i] = p * dc_losses
+    # pdc - losses as a single multiply
+    out = p * (1.0 - dc_losses)
+    output[i] = out
+    clipping[i] = max(out - cap_over_eta, 0.0)
+  
+  return pdc, losses, output, clipping
+
 def run_pvwatts_dc(self):
   '''
   Run the pvwatts dc model within pvlib and apply custom dc losses.
   This is a custom method added to modelchain class.
   Modelchain instance must already have the following attributes assigned:
     dc_losses, ac_capacity, inverter_efficiency_peak
+  Results are saved as numpy arrays in the dc_arr dict.
   
   '''
 
-  pdc = self.system.pvwatts_dc(g_poa_effective =
-                                self.effective_irradiance_soiled,
-                              temp_cell = self.cell_temperature)
-  
-  self.dc = pd.DataFrame({'pdc': pdc})
-  self.dc['losses'] = self.dc.pdc * self.dc_losses
-  # Note: calling dc.losses time series, not the dc_losses attribute
-  self.dc['output'] = self.dc.pdc - self.dc.losses
-  self.dc['clipping'] = self.dc.output - (self.ac_capacity / 
-                                          self.inverter_efficiency_peak)
-  self.dc.clipping[self.dc.clipping < 0] = 0
+  # Inverter dc rating, used for dc clipping
+  ac_over_eta = self.ac_capacity / self.inverter_efficiency_peak
+  
+  # Same model as self.system.pvwatts_dc, without pvlib's pandas wrapper
+  pdc, losses, output, clipping = _pvwatts_dc_loss_clip(
+    np.asarray(self.effective_irradiance_soiled, dtype = np.float64),
+    np.asarray(self.cell_temperature, dtype = np.float64),
+    self.system.module_parameters['pdc0'],
+    self.system.module_parameters['gamma_pdc'],
+    self.system.module_parameters.get('temp_ref', 25.0),
+    self.dc_losses, ac_over_eta)
+  
+  # Plain arrays keep pandas out of the dc -> ac -> plant chain; see finalize
+  self.dc_arr = {'pdc': pdc, 'losses': losses, 'output': output,
+                 'clipping': clipping}
     
   return self
  
+# Only fastmath flags that keep NaN/inf semantics, so NaN still passes through
+# the clamps to get_results' nansum
+@numba.njit(fastmath = {'contract', 'arcp'}, cache = True)
+def _ac_chain(pac, pmt_pk, pmt_rating, pmt_c, ac_coll, mpt_pk, mpt_br, mpt_c,
+              tx, poi):
+  '''
+  AC loss chain from inverter output to the point of interconnection, fused
+  into a single pass over pac so no intermediate time series are allocated.
+  
+  Returns:
+  output, losses, clipping: numpy.ndarray
+  
+  '''
+  
+  # Squares as multiplies, with the rating reciprocals hoisted out of the loop
+  pmt_r = 1.0 / (.98 * pmt_rating)
+  mpt_r = 1.0 / (.98 * mpt_br)
+  
+  n = len(pac)
+  output = np.empty(n)
+  losses = np.empty(n)
+  clipping = np.empty(n)
+  
+  for i in range(n):
+    p = pac[i]
+    # PMT losses
+    tmp = p * pmt_r
+    pmt = max(p - (pmt_pk * (tmp * tmp) + pmt_c), 0.0)
+    # AC Collection losses
+    mpt_in = pmt * (1 - ac_coll)
+    # Main Power Transformer losses
+    tmp = mpt_in * mpt_r
+    mpt = max(mpt_in - (mpt_pk * (tmp * tmp) + mpt_c), 0.0)
+    # Transmission line losses and plant clipping
+    out = mpt * (1 - tx)
+    output[i] = out
+    losses[i] = p - out
+    clipping[i] = max(out - poi, 0.0)
+  
+  return output, losses, clipping
+
 def run_pvwatts_ac(self):
   '''
   Run the pvwatts ac model within pvlib and apply custom ac losses.
   This is a custom method added to modelchain class.
   Modelchain instance must already have the following attributes assigned:
-    dc.output, ac_capacity, inverter_efficiency_peak, pmt_peak_loss, pmt_rating,
-    pmt_constant_loss, ac_collection, mpt_peak_loss, mpt_bottom_rating,
-    mpt_constant_loss, transmission_loss, poi_capacity  
+    dc_arr, ac_capacity, inverter_efficiency_peak, pmt_peak_loss,
+    pmt_rating, pmt_constant_loss, ac_collection, mpt_peak_loss,
+    mpt_bottom_rating, mpt_constant_loss, transmission_loss, poi_capacity  
+  Results are saved as numpy arrays in the ac_arr dict.
     
   '''
   
-  pac = pvlib.pvsystem.pvwatts_ac(pdc = self.dc.output,
-                                  pdc0 = self.ac_capacity /
-                                    self.inverter_efficiency_peak,
-                                  eta_inv_nom = self.inverter_efficiency_peak)
-  
-  self.ac = pd.DataFrame({'pac': pac})
-  
-  # PMT losses
-  pmt_out = self.ac.pac - (self.pmt_peak_loss *
-                          (self.ac.pac / .98 / self.pmt_rating)**2 +
-                          self.pmt_constant_loss)
-                          
-  pmt_out[pmt_out < 0] = 0
-  
-  # AC Collection losses
-  mpt_in = pmt_out * (1 - self.ac_collection)
+  # Inverter dc rating, used as pdc0 of the ac model
+  ac_over_eta = self.ac_capacity / self.inverter_efficiency_peak
   
-  # Main Power Transformer losses
-  mpt_out = mpt_in - (self.mpt_peak_loss *
-                     (mpt_in / .98 / self.mpt_bottom_rating)**2 +
-                     self.mpt_constant_loss)
-  
-  mpt_out[mpt_out < 0] = 0
+  pac = pvlib.pvsystem.pvwatts_ac(pdc = self.dc_arr['output'],
+                                  pdc0 = ac_over_eta,
+                                  eta_inv_nom = self.inverter_efficiency_peak)
   
-  # Transmission line losses and plant clipping
-  self.ac['output'] = mpt_out * (1 - self.transmission_loss)
-  self.ac['losses'] = self.ac.pac - self.ac.output
-  self.ac['clipping'] = self.ac.output - self.poi_capacity
-  self.ac.clipping[self.ac.clipping < 0] = 0
+  output, losses, clipping = _ac_chain(np.asarray(pac, dtype = np.float64),
+                                       self.pmt_peak_loss, self.pmt_rating,
+                                       self.pmt_constant_loss,
+                                       self.ac_collection, self.mpt_peak_loss,
+                                       self.mpt_bottom_rating,
+                                       self.mpt_constant_loss,
+                                       self.transmission_loss,
+                                       self.poi_capacity)
+  
+  self.ac_arr = {'pac': np.asarray(pac), 'output': output, 'losses': losses,
+                 'clipping': clipping}
     
   return self
 
@@ -451,12 +687,14 @@ def run_plant_model(self):
   Model plant output, accounting for clipping at poi and plant losses
   This is a custom method added to modelchain class.
   Modelchain instance must already have the following attributes assigned:
-    ac.output, ac.clipping, plant_losses
+    ac_arr, plant_losses
+  Results are saved as numpy arrays in the plant_arr dict.
     
   '''
   
-  self.plant = pd.DataFrame({'output': self.ac.output - self.ac.clipping})
-  self.plant['losses'] = self.plant.output * self.plant_losses
+  output = self.ac_arr['output'] - self.ac_arr['clipping']
+  
+  self.plant_arr = {'output': output, 'losses': output * self.plant_losses}
     
   return self
 
@@ -466,20 +704,45 @@ def get_results(self):
   attributes.
   This is a custom method addded to modelchain class.
   Modelchain instance must already have the following attributes assigned:
-    plant.output, plant.losses, poi_capacity, dc_capacity, time_step
+    plant_arr, poi_capacity, dc_capacity, time_step
   
   '''
 
-  self.aep = ((self.plant.output.sum() - self.plant.losses.sum()) *
-              self.time_step / 60)
+  # Sum the raw arrays to skip pandas' reduction overhead (nansum keeps
+  # pandas' skipna behavior)
+  plant_output = np.nansum(self.plant_arr['output'])
+  plant_losses = np.nansum(self.plant_arr['losses'])
+  effective_irradiance = np.nansum(self.effective_irradiance.to_numpy())
+  
+  self.aep = (plant_output - plant_losses) * self.time_step / 60
   
   self.ncf = self.aep / self.poi_capacity / 8760
   
   self.energy_yield = self.aep / self.dc_capacity
   
   # Only using front-side irradiance in Performance Ratio calculation
-  self.pr = 1 - self.aep / (self.effective_irradiance.sum() *
+  self.pr = 1 - self.aep / (effective_irradiance *
                 self.time_step / 60 * (self.dc_capacity /
                 self.system.module_parameters['efficiency'] / 1000))
     
   return self
+
+
+def finalize(self):
+  '''
+  Build the dc, ac and plant DataFrames from the arrays saved by
+  run_pvwatts_dc, run_pvwatts_ac and run_plant_model, indexed like the
+  weather.  Call after the model chain when time series output is needed.
+  This is a custom method added to modelchain class.
+  Modelchain instance must already have the following attributes assigned:
+    dc_arr, ac_arr, plant_arr, effective_irradiance_soiled
+  
+  '''
+  
+  index = self.effective_irradiance_soiled.index
+  
+  self.dc = pd.DataFrame(self.dc_arr, index = index)
+  self.ac = pd.DataFrame(self.ac_arr, index = index)
+  self.plant = pd.DataFrame(self.plant_arr, index = index)
+  
+  return self